@@ -1,23 +1,26 @@
 import streamlit as st
 import datetime
-import time
+import hashlib
 import httpx
 import requests
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 import os
 from fpdf import FPDF
 from docx import Document
 import plotly.express as px
+import planilha
+import snapshot
+import resiliencia
+import busca_clientes
 
 # -------------------- Configurações Iniciais --------------------
 st.set_page_config(page_title="Sistema Jurídico - Fernanda Freitas", layout="wide")
 load_dotenv()
 
-# Configuração da API DeepSeek e do Google Apps Script
-GAS_WEB_APP_URL = "https://script.google.com/macros/s/AKfycbzx0HbjObfhgU4lqVFBI05neopT-rb5tqlGbJU19EguKq8LmmtzkTPtZjnMgCNmz8OtLw/exec"
-
 # -------------------- Usuários Persistidos --------------------
 USUARIOS_FIXOS = {
     "dono": {
@@ -45,6 +48,9 @@ USUARIOS_FIXOS = {
 
 # -------------------- Funções Auxiliares --------------------
 def converter_data(data_str):
+    if isinstance(data_str, datetime.datetime):
+        # valores vindos das colunas tipadas (pd.Timestamp / NaT)
+        return datetime.date.today() if pd.isna(data_str) else data_str.date()
     if not data_str:
         return datetime.date.today()
     try:
@@ -58,42 +64,306 @@ def converter_data(data_str):
 @st.cache_data(ttl=300, show_spinner=False)
 def carregar_dados_da_planilha(tipo, debug=False, retries=3, timeout=30):
     """
-    Faz requisição ao Google Apps Script para carregar dados de uma aba específica,
-    tenta até `retries` vezes em caso de timeout, e retorna lista de dicts ou [].
+    Faz requisição ao Google Apps Script para carregar dados de uma aba específica
+    e retorna lista de dicts. Falhas lançam exceção, para não ficarem no cache.
+    """
+    return planilha.requisitar_planilha(tipo, debug=debug, retries=retries, timeout=timeout).json()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def carregar_tabela_da_planilha(tipo, debug=False, retries=3, timeout=30):
+    """Versão em cache de `buscar_tabela_da_planilha`; falhas não ficam no cache."""
+    tabela = planilha.buscar_tabela_da_planilha(tipo, debug=debug, retries=retries, timeout=timeout)
+    tabela.attrs["versao"] = f"gas-{datetime.datetime.now().isoformat()}"
+    return tabela
+
+# Texto dos snapshots como string do Arrow com semântica de NaN (o `str` do
+# pandas 3): a coluna aponta para os buffers do arquivo mapeado, em vez de
+# copiar cada valor para um objeto Python em cada processo.
+try:
+    TEXTO_ARROW = pd.StringDtype("pyarrow", na_value=np.nan)
+except TypeError:  # pandas < 2.3
+    TEXTO_ARROW = pd.StringDtype("pyarrow_numpy")
+
+@st.cache_resource(max_entries=len(snapshot.ABAS) * 2, show_spinner=False)
+def _tabela_do_snapshot(tipo, versao):
+    # `versao` só entra na chave do cache: muda quando o atualizador publica.
+    # O objeto é compartilhado entre sessões, por isso não deve ser alterado.
+    tabela = snapshot.ler_snapshot(tipo).to_pandas(
+        split_blocks=True,
+        types_mapper={pa.string(): TEXTO_ARROW, pa.large_string(): TEXTO_ARROW}.get
+    )
+    tabela.attrs["versao"] = f"snapshot-{versao}"
+    return tabela
+
+@st.cache_resource(max_entries=len(snapshot.ABAS) * 2, show_spinner=False)
+def _registros_do_snapshot(tipo, versao):
+    # Compartilhado entre sessões, como `_tabela_do_snapshot`: não deve ser alterado.
+    return snapshot.ler_snapshot(tipo).to_pylist()
+
+def _ultimo_valor_valido(tipo, erro, vazio, do_snapshot):
     """
-    for attempt in range(1, retries+1):
-        try:
-            response = requests.get(
-                GAS_WEB_APP_URL,
-                params={"tipo": tipo},
-                timeout=timeout
+    Retorna os últimos dados carregados com sucesso da aba quando o Apps Script
+    falha (ou o disjuntor está aberto), avisando o usuário. Sem eles, usa o
+    snapshot da aba em disco com `do_snapshot(tipo, versao)`, mesmo que vencido
+    ou ignorado por esta sessão após uma gravação: é melhor que uma aba vazia.
+    """
+    valor, carregado_em = planilha.CLIENTE_GAS.ultimo_valor(tipo)
+    if valor is None:
+        versao = snapshot.versao_snapshot(tipo)
+        if versao:
+            idade = snapshot.idade_snapshot(tipo) or 0
+            st.warning(
+                f"Apps Script indisponível para '{tipo}' ({erro}). "
+                f"Exibindo o snapshot confirmado há {idade / 60:.0f} min."
             )
-            response.raise_for_status()
-            if debug:
-                st.text(f"[DEBUG] Tentativa {attempt} — URL: {response.url}")
-                st.text(f"[DEBUG] Resposta (primeiros 500 chars): {response.text[:500]}")
-            return response.json()
-        except requests.exceptions.ReadTimeout:
-            if attempt < retries:
-                st.warning(f"Timeout ao carregar '{tipo}', tentativa {attempt}/{retries}. Retentando em 2 s…")
-                time.sleep(2)
-                continue
-            else:
-                st.error(f"Timeout ao carregar dados ('{tipo}') após {retries} tentativas.")
-                return []
-        except Exception as e:
-            st.error(f"Erro ao carregar dados ('{tipo}'): {e}")
-            return []
+            return do_snapshot(tipo, versao)
+        st.error(f"Erro ao carregar dados ('{tipo}'): {erro}")
+        return vazio
+    hora = datetime.datetime.fromtimestamp(carregado_em).strftime("%H:%M")
+    st.warning(f"Apps Script indisponível para '{tipo}' ({erro}). Exibindo os dados carregados às {hora}.")
+    return valor
+
+def _versao_snapshot_valida(tipo):
+    """
+    Versão do snapshot publicado da aba, ou None se não houver, se o atualizador
+    não o confirma há mais de snapshot.VALIDADE segundos, ou se esta sessão
+    gravou na aba depois dele (ver `recarregar_aba`). Nesses casos a aba vem do
+    Apps Script.
+    """
+    versao = snapshot.versao_snapshot(tipo)
+    idade = snapshot.idade_snapshot(tipo)
+    if not versao or idade is None or idade > snapshot.VALIDADE:
+        return None
+    if versao == st.session_state.get("snapshot_ignorado", {}).get(tipo):
+        return None
+    return versao
+
+def obter_tabela(tipo):
+    """
+    Retorna a aba como DataFrame tipado: do snapshot compartilhado em
+    SNAPSHOT_DIR, se publicado, ou direto do Apps Script.
+    """
+    versao = _versao_snapshot_valida(tipo)
+    if versao:
+        return _tabela_do_snapshot(tipo, versao)
+    try:
+        tabela = carregar_tabela_da_planilha(tipo)
+    except Exception as e:
+        return _ultimo_valor_valido(tipo, e, planilha.montar_tabela(tipo, {}), _tabela_do_snapshot)
+    planilha.CLIENTE_GAS.guardar_valor(tipo, tabela)
+    return tabela
+
+def obter_registros(tipo):
+    """
+    Retorna a aba como lista de dicts: do snapshot compartilhado em
+    SNAPSHOT_DIR, se publicado, ou direto do Apps Script.
+    """
+    versao = _versao_snapshot_valida(tipo)
+    if versao:
+        return _registros_do_snapshot(tipo, versao)
+    try:
+        registros = carregar_dados_da_planilha(tipo) or []
+    except Exception as e:
+        return _ultimo_valor_valido(tipo, e, [], _registros_do_snapshot)
+    planilha.CLIENTE_GAS.guardar_valor(tipo, registros)
+    return registros
+
+def recarregar_aba(tipo, mensagem):
+    """
+    Após gravar na planilha: descarta o cache da aba e reexecuta o app inteiro,
+    para que todas as seções vejam o dado novo. O snapshot atual da aba, se
+    houver, já está desatualizado e deixa de ser usado por esta sessão. A
+    mensagem é exibida no topo da próxima execução.
+    """
+    versao = snapshot.versao_snapshot(tipo)
+    if versao:
+        st.session_state.setdefault("snapshot_ignorado", {})[tipo] = versao
+    carregar_tabela_da_planilha.clear(tipo)
+    carregar_dados_da_planilha.clear(tipo)
+    st.session_state.mensagem_sucesso = mensagem
+    st.rerun()
+
+def exibir_estado_apps_script():
+    """Mostra na sidebar o estado dos disjuntores e as latências por aba."""
+    estado = planilha.CLIENTE_GAS.estado()
+    abertos = {
+        chave: d for chave, d in estado["disjuntores"].items()
+        if d["estado"] == resiliencia.Disjuntor.ABERTO
+    }
+    if estado["servico"] == resiliencia.Disjuntor.ABERTO:
+        st.sidebar.warning(
+            f"🔴 Apps Script indisponível — exibindo os últimos dados válidos. "
+            f"Nova tentativa em {estado['segundos_para_teste']:.0f} s."
+        )
+    elif abertos:
+        for chave, d in abertos.items():
+            st.sidebar.warning(f"🔴 {chave}: indisponível. Nova tentativa em {d['segundos_para_teste']:.0f} s.")
+    elif estado["servico"] == resiliencia.Disjuntor.SEMIABERTO or any(
+        d["estado"] == resiliencia.Disjuntor.SEMIABERTO for d in estado["disjuntores"].values()
+    ):
+        st.sidebar.info("🟡 Apps Script: testando recuperação")
+    else:
+        st.sidebar.caption("🟢 Apps Script: normal")
+    exibir_estado_snapshots()
+    if estado["latencias"]:
+        with st.sidebar.expander("Latência do Apps Script"):
+            st.dataframe(pd.DataFrame(estado["latencias"]).T.round(2))
+
+def exibir_estado_snapshots():
+    """Mostra na sidebar há quanto tempo os snapshots foram confirmados pelo atualizador."""
+    idades = {tipo: snapshot.idade_snapshot(tipo) for tipo in snapshot.ABAS}
+    idades = {tipo: idade for tipo, idade in idades.items() if idade is not None}
+    if not idades:
+        return
+    vencidas = [tipo for tipo, idade in idades.items() if idade > snapshot.VALIDADE]
+    if vencidas:
+        st.sidebar.warning(
+            f"📦 Snapshot desatualizado ({', '.join(vencidas)}): atualizador parado? "
+            f"Lendo essas abas direto do Apps Script."
+        )
+    else:
+        st.sidebar.caption(f"📦 Snapshot confirmado há {max(idades.values()) / 60:.0f} min")
+
+def calcular_status_processos(processos):
+    """
+    Versão vetorizada de `calcular_status_processo` sobre o DataFrame de processos.
+    Retorna uma Series de status alinhada ao índice do DataFrame.
+    """
+    hoje = pd.Timestamp(datetime.date.today())
+    dias_restantes = (processos["prazo"].fillna(hoje) - hoje).dt.days
+    status = np.select(
+        [processos["encerrado"], processos["houve_movimentacao"], dias_restantes < 0, dias_restantes <= 10],
+        ["⚫ Encerrado", "🔵 Movimentado", "🔴 Atrasado", "🟡 Atenção"],
+        default="🟢 Normal"
+    )
+    return pd.Series(status, index=processos.index)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def status_processos_em_cache(_processos, versao, hoje):
+    # Memoizado por versão dos dados e dia; `hoje` entra na chave porque o status depende da data.
+    # Compartilhado entre sessões (sem cópia), por isso não deve ser alterado.
+    return calcular_status_processos(_processos)
+
+def chaves_clientes(clientes):
+    """Chave de cada cliente: o e-mail, ou o nome quando não houver e-mail."""
+    return clientes["email"].where(clientes["email"] != "", clientes["nome"])
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def conteudo_clientes(versao, _clientes):
+    """
+    Hash das chaves e nomes dos clientes, calculado uma vez por carga (ver
+    `attrs["versao"]`). Não muda quando a recarga traz os mesmos clientes.
+    """
+    colunas = pd.DataFrame({"chave": chaves_clientes(_clientes), "nome": _clientes["nome"]})
+    return hashlib.sha1(pd.util.hash_pandas_object(colunas, index=False).values.tobytes()).hexdigest()
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def indice_de_clientes(conteudo, _clientes):
+    # Construído uma vez por conteúdo (ver `conteudo_clientes`), não a cada recarga da aba.
+    return busca_clientes.IndiceClientes(chaves_clientes(_clientes), _clientes["nome"])
+
+def indice_clientes(clientes):
+    return indice_de_clientes(conteudo_clientes(clientes.attrs.get("versao", ""), clientes), clientes)
+
+def seletor_cliente(clientes, rotulo, key, atual=None):
+    """
+    Busca de cliente pelo índice de prefixo/trigramas seguida da seleção.
+    Deve ficar fora de st.form, para atualizar a cada busca. `key` identifica o
+    campo de busca. Com a busca vazia, a única opção é `atual` (chave, nome), se
+    informado; a chave de `atual` pode ser "" (cliente sem cadastro resolvido).
+    Retorna (chave, nome) ou None.
+    """
+    indice = indice_clientes(clientes)
+    busca = st.text_input(f"Buscar {rotulo}", placeholder="Digite parte do nome do cliente", key=f"{key}_busca")
+    if busca:
+        opcoes = [(chave, nome) for chave, nome, _ in indice.buscar(busca)]
+    else:
+        opcoes = [atual] if atual and atual[1] else []
+    return st.selectbox(
+        rotulo,
+        opcoes,
+        format_func=lambda r: r[1] if r[0] in ("", r[1]) else f"{r[1]} ({r[0]})"
+    )
+
+DIMENSOES_FINANCEIRAS = {"Escritório": "escritorio", "Área": "area", "Advogado": "responsavel"}
+
+def formatar_moeda(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def calcular_analise_financeira(_processos, versao, dimensao, escritorios=(), areas=(), responsaveis=(),
+                                contratos=(), periodo=None, janela_meses=3):
+    """
+    Agregações financeiras (valor_total x valor_movimentado) dos processos,
+    agrupadas pela coluna `dimensao`. O cache é indexado pela `versao` dos dados
+    (ver `attrs["versao"]`) e pelos filtros; o DataFrame não é hasheado.
+    Retorna um dict com "resumo", "por_grupo", "por_contrato" e "mensal".
+    """
+    mascara = pd.Series(True, index=_processos.index)
+    for coluna, valores in (("escritorio", escritorios), ("area", areas),
+                            ("responsavel", responsaveis), ("contrato", contratos)):
+        if valores:
+            mascara &= _processos[coluna].isin(valores)
+    if periodo:
+        inicio, fim = periodo
+        mascara &= _processos["data_cadastro"].between(pd.Timestamp(inicio), pd.Timestamp(fim))
+    dados = _processos.loc[mascara, [dimensao, "contrato", "valor_total", "valor_movimentado", "data_cadastro"]]
+
+    def agregar(por):
+        grupos = dados.groupby(por, observed=True).agg(
+            processos=("valor_total", "size"),
+            contratado=("valor_total", "sum"),
+            realizado=("valor_movimentado", "sum")
+        )
+        grupos["realizado_sobre_contratado"] = (grupos["realizado"] / grupos["contratado"]).where(grupos["contratado"] > 0, 0.0)
+        return grupos.sort_values("contratado", ascending=False)
+
+    contratado = float(dados["valor_total"].sum())
+    realizado = float(dados["valor_movimentado"].sum())
+    resumo = {
+        "processos": len(dados),
+        "contratado": contratado,
+        "realizado": realizado,
+        "realizado_sobre_contratado": realizado / contratado if contratado else 0.0
+    }
+
+    # Série mensal por grupo, com meses sem cadastro preenchidos com zero
+    com_data = dados.dropna(subset=["data_cadastro"])
+    mes = com_data["data_cadastro"].dt.to_period("M").dt.to_timestamp().rename("mes")
+    mensal = com_data.groupby([com_data[dimensao], mes], observed=True)[["valor_total", "valor_movimentado"]].sum()
+    if mensal.empty:
+        serie = pd.DataFrame(columns=["mes", dimensao, "contratado", "realizado", "contratado_movel", "realizado_movel"])
+    else:
+        meses = pd.date_range(mes.min(), mes.max(), freq="MS", name="mes")
+        contratado_mes = mensal["valor_total"].unstack(dimensao, fill_value=0.0).reindex(meses, fill_value=0.0)
+        realizado_mes = mensal["valor_movimentado"].unstack(dimensao, fill_value=0.0).reindex(meses, fill_value=0.0)
+        serie = pd.concat({
+            "contratado": contratado_mes.stack(),
+            "realizado": realizado_mes.stack(),
+            "contratado_movel": contratado_mes.rolling(janela_meses, min_periods=1).sum().stack(),
+            "realizado_movel": realizado_mes.rolling(janela_meses, min_periods=1).sum().stack()
+        }, axis=1).reset_index()
+    return {
+        "resumo": resumo,
+        "por_grupo": agregar(dimensao),
+        "por_contrato": agregar("contrato"),
+        "mensal": serie
+    }
 
 def enviar_dados_para_planilha(tipo, dados):
     """
     Envia os dados para a aba especificada em 'tipo' via Google Apps Script.
-    Retorna True se o envio foi bem-sucedido.
+    Passa pelo disjuntor da gravação, mas roda na própria thread, sem fila,
+    repetição nem hedge, já que o envio não é idempotente. Retorna True se o
+    envio foi bem-sucedido.
     """
+    def requisicao(limite):
+        with httpx.Client(timeout=limite, follow_redirects=True) as client:
+            return client.post(planilha.GAS_WEB_APP_URL, json=payload)
+
     try:
         payload = {"tipo": tipo, **dados}
-        with httpx.Client(timeout=10, follow_redirects=True) as client:
-            response = client.post(GAS_WEB_APP_URL, json=payload)
+        response = planilha.CLIENTE_GAS.executar_escrita(f"POST {tipo}", requisicao, teto_timeout=10)
         if response.text.strip() == "OK":
             return True
         else:
@@ -104,7 +374,7 @@ def enviar_dados_para_planilha(tipo, dados):
         return False
 
 def carregar_usuarios_da_planilha():
-    funcionarios = carregar_dados_da_planilha("Funcionario") or []
+    funcionarios = obter_registros("Funcionario")
     users_dict = {}
     if not funcionarios:
         users_dict["dono"] = {"username": "dono", "senha": "dono123", "papel": "owner", "escritorio": "Global", "area": "Todas"}
@@ -241,9 +511,12 @@ def excluir_processo(numero_processo):
     return enviar_dados_para_planilha("Processo", payload)
 
 def get_dataframe_with_cols(data, columns):
-    if isinstance(data, dict):
-        data = [data]
-    df = pd.DataFrame(data)
+    if isinstance(data, pd.DataFrame):
+        df = data[[col for col in columns if col in data.columns]].copy()
+    else:
+        if isinstance(data, dict):
+            data = [data]
+        df = pd.DataFrame(data)
     for col in columns:
         if col not in df.columns:
             df[col] = ""
@@ -254,10 +527,391 @@ def buscar_processo_por_numero(numero, processos):
     Retorna o dict do processo cujo 'numero' coincide com o informado,
     ou None se não encontrar.
     """
-    for p in processos:
-        if p.get("numero") == numero:
-            return p
-    return None
+    encontrados = processos[processos["numero"] == numero]
+    if encontrados.empty:
+        return None
+    return encontrados.iloc[0].to_dict()
+
+
+##############################
+# Seções da Interface (fragments)
+##############################
+# Cada seção é um st.fragment: interações com os widgets dela reexecutam só a
+# própria função, com os dados recebidos na última execução completa do app.
+
+@st.fragment
+def painel_processos(processos, area_fixa):
+    # ── Filtros ──
+    with st.expander("🔍 Filtros", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        filtro_area = area_fixa or col1.selectbox(
+            "Área",
+            ["Todas"] + sorted(processos["area"].unique())
+        )
+        filtro_status = col2.selectbox(
+            "Status",
+            ["Todos", "🔴 Atrasado", "🟡 Atenção", "🟢 Normal", "🔵 Movimentado", "⚫ Encerrado"]
+        )
+        filtro_escritorio = col3.selectbox(
+            "Escritório",
+            ["Todos"] + sorted(processos["escritorio"].unique())
+        )
+
+    # ── Aplica filtros ──
+    status_processos = status_processos_em_cache(processos, processos.attrs.get("versao", ""), datetime.date.today())
+    mascara = pd.Series(True, index=processos.index)
+    if area_fixa:
+        mascara &= processos["area"] == area_fixa
+    elif filtro_area != "Todas":
+        mascara &= processos["area"] == filtro_area
+
+    if filtro_status != "Todos":
+        if filtro_status == "⚫ Encerrado":
+            mascara &= processos["encerrado"]
+        else:
+            mascara &= status_processos == filtro_status
+
+    if filtro_escritorio != "Todos":
+        mascara &= processos["escritorio"] == filtro_escritorio
+    processos_visiveis = processos[mascara]
+    status_visiveis = status_processos[mascara]
+
+    # ── Métricas ──
+    st.subheader("📊 Visão Geral")
+    total = len(processos_visiveis)
+    atrasados = int((status_visiveis == "🔴 Atrasado").sum())
+    atencao = int((status_visiveis == "🟡 Atenção").sum())
+    movimentados = int(processos_visiveis["houve_movimentacao"].sum())
+    encerrados = int(processos_visiveis["encerrado"].sum())
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Total", total)
+    c2.metric("Atrasados", atrasados)
+    c3.metric("Atenção", atencao)
+    c4.metric("Movimentados", movimentados)
+    c5.metric("Encerrados", encerrados)
+
+    # ── Lista de Processos ──
+    st.subheader("📋 Lista de Processos")
+    if not processos_visiveis.empty:
+        cols = ["numero", "cliente", "area", "prazo", "responsavel", "link_material"]
+        df_proc = get_dataframe_with_cols(processos_visiveis, cols)
+        df_proc["prazo"] = df_proc["prazo"].dt.date
+        df_proc["Status"] = status_visiveis
+        ordem = {"🔴 Atrasado": 0, "🟡 Atenção": 1, "🟢 Normal": 2, "🔵 Movimentado": 3, "⚫ Encerrado": 4}
+        df_proc = df_proc.assign(ord=df_proc["Status"].map(ordem)) \
+                         .sort_values("ord") \
+                         .drop("ord", axis=1)
+        df_proc["link_material"] = df_proc["link_material"].apply(
+            lambda x: f"[Abrir Material]({x})" if x else ""
+        )
+        st.dataframe(df_proc)
+    else:
+        st.info("Nenhum processo encontrado com os filtros aplicados")
+
+@st.fragment
+def painel_financeiro(processos, area_fixa):
+    with st.expander("🔍 Filtros", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        filtro_escritorios = col1.multiselect("Escritórios", sorted(processos["escritorio"].unique()))
+        filtro_areas = (area_fixa,) if area_fixa else col2.multiselect("Áreas", sorted(processos["area"].unique()))
+        filtro_responsaveis = col3.multiselect("Advogados", sorted(processos["responsavel"].unique()))
+        col4, col5, col6, col7 = st.columns(4)
+        filtro_contratos = col4.multiselect("Tipo de Contrato", ["Fixo", "Por Ato", "Contingência"])
+        datas_cadastro = processos["data_cadastro"].dropna()
+        hoje = datetime.date.today()
+        periodo_completo = (datas_cadastro.min().date(), datas_cadastro.max().date()) if not datas_cadastro.empty else (hoje, hoje)
+        periodo = col5.date_input("Período de cadastro", value=periodo_completo)
+        # Só filtra se o usuário restringir o período: processos sem data de
+        # cadastro ficam de fora de qualquer intervalo.
+        periodo = tuple(periodo) if len(periodo) == 2 and tuple(periodo) != periodo_completo else None
+        dimensao = col6.selectbox("Agrupar por", list(DIMENSOES_FINANCEIRAS))
+        janela_meses = col7.selectbox("Janela móvel (meses)", [3, 6, 12])
+
+    analise = calcular_analise_financeira(
+        processos,
+        processos.attrs.get("versao", ""),
+        DIMENSOES_FINANCEIRAS[dimensao],
+        escritorios=tuple(filtro_escritorios),
+        areas=tuple(filtro_areas),
+        responsaveis=tuple(filtro_responsaveis),
+        contratos=tuple(filtro_contratos),
+        periodo=periodo,
+        janela_meses=janela_meses
+    )
+    resumo = analise["resumo"]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Processos", resumo["processos"])
+    c2.metric("Valor Contratado", formatar_moeda(resumo["contratado"]))
+    c3.metric("Valor Realizado", formatar_moeda(resumo["realizado"]))
+    c4.metric("Realizado / Contratado", f"{resumo['realizado_sobre_contratado']:.1%}")
+
+    if resumo["processos"]:
+        por_grupo = analise["por_grupo"]
+        st.subheader(f"Por {dimensao}")
+        st.plotly_chart(
+            px.bar(por_grupo.reset_index(), x=DIMENSOES_FINANCEIRAS[dimensao], y=["contratado", "realizado"], barmode="group"),
+            use_container_width=True
+        )
+        st.dataframe(por_grupo.style.format({
+            "contratado": formatar_moeda,
+            "realizado": formatar_moeda,
+            "realizado_sobre_contratado": "{:.1%}"
+        }))
+
+        st.subheader("Por Tipo de Contrato")
+        st.dataframe(analise["por_contrato"].style.format({
+            "contratado": formatar_moeda,
+            "realizado": formatar_moeda,
+            "realizado_sobre_contratado": "{:.1%}"
+        }))
+
+        mensal = analise["mensal"]
+        if not mensal.empty:
+            st.subheader(f"Série Mensal — acumulado móvel de {janela_meses} meses")
+            metrica = st.radio("Valor", ["realizado_movel", "contratado_movel", "realizado", "contratado"], horizontal=True)
+            st.plotly_chart(
+                px.line(mensal, x="mes", y=metrica, color=DIMENSOES_FINANCEIRAS[dimensao], markers=True),
+                use_container_width=True
+            )
+    else:
+        st.info("Nenhum processo encontrado com os filtros aplicados")
+
+@st.fragment
+def botoes_exportacao(rotulo, nome_arquivo, gerar_texto):
+    """
+    Botões "Exportar <rotulo> (TXT/PDF)". O texto só é gerado, por
+    `gerar_texto()`, quando um dos botões é clicado.
+    """
+    col_export1, col_export2 = st.columns(2)
+    with col_export1:
+        if st.button(f"Exportar {rotulo} (TXT)"):
+            st.download_button("Baixar TXT", gerar_texto(), file_name=f"{nome_arquivo}.txt")
+    with col_export2:
+        if st.button(f"Exportar {rotulo} (PDF)"):
+            pdf_file = exportar_pdf(gerar_texto(), nome_arquivo=nome_arquivo)
+            with open(pdf_file, "rb") as f:
+                st.download_button("Baixar PDF", f, file_name=pdf_file)
+
+@st.fragment
+def formulario_cliente(escritorios):
+    with st.form("form_cliente"):
+        nome       = st.text_input("Nome Completo*", key="nome_cliente")
+        email      = st.text_input("E-mail*")
+        telefone   = st.text_input("Telefone*")
+        aniversario = st.date_input("Data de Nascimento")
+        endereco   = st.text_input("Endereço*", placeholder="Rua, número, bairro, cidade, CEP")
+        escritorio = st.selectbox("Escritório", [e["nome"] for e in escritorios] + ["Outro"])
+        observacoes = st.text_area("Observações")
+        if st.form_submit_button("Salvar Cliente"):
+            if not nome or not email or not telefone or not endereco:
+                st.warning("Campos obrigatórios não preenchidos!")
+            else:
+                novo_cliente = {
+                    "nome": nome,
+                    "email": email,
+                    "telefone": telefone,
+                    "aniversario": aniversario.strftime("%Y-%m-%d"),
+                    "endereco": endereco,
+                    "observacoes": observacoes,
+                    "cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "responsavel": st.session_state.usuario,
+                    "escritorio": escritorio
+                }
+                if enviar_dados_para_planilha("Cliente", novo_cliente):
+                    recarregar_aba("Cliente", "Cliente cadastrado com sucesso!")
+
+@st.fragment
+def formulario_processo(clientes):
+    cliente_escolhido = seletor_cliente(clientes, "Cliente*", key="processo_cliente")
+    with st.form("form_processo"):
+        numero_processo = st.text_input("Número do Processo*")
+        tipo_contrato   = st.selectbox("Tipo de Contrato*", ["Fixo", "Por Ato", "Contingência"])
+        descricao       = st.text_area("Descrição do Caso*")
+        col1, col2      = st.columns(2)
+        with col1:
+            valor_total = st.number_input("Valor Total (R$)*", min_value=0.0, format="%.2f")
+        with col2:
+            valor_movimentado = st.number_input("Valor Movimentado (R$)", min_value=0.0, format="%.2f")
+        prazo_inicial   = st.date_input("Prazo Inicial*", value=datetime.date.today())
+        prazo_final     = st.date_input("Prazo Final*", value=datetime.date.today() + datetime.timedelta(days=30))
+        houve_mov       = st.checkbox("Houve movimentação recente?")
+        area            = st.selectbox("Área Jurídica*", ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário"])
+        link_material   = st.text_input("Link do Material Complementar (opcional)")
+        encerrado       = st.checkbox("Processo Encerrado?")
+        if st.form_submit_button("Salvar Processo"):
+            if not (cliente_escolhido and numero_processo and descricao):
+                st.warning("Campos obrigatórios (*) não preenchidos!")
+            else:
+                novo = {
+                    "cliente": cliente_escolhido[1],
+                    "cliente_chave": cliente_escolhido[0],
+                    "numero": numero_processo,
+                    "contrato": tipo_contrato,
+                    "descricao": descricao,
+                    "valor_total": valor_total,
+                    "valor_movimentado": valor_movimentado,
+                    "prazo_inicial": prazo_inicial.strftime("%Y-%m-%d"),
+                    "prazo": prazo_final.strftime("%Y-%m-%d"),
+                    "houve_movimentacao": houve_mov,
+                    "encerrado": encerrado,
+                    "escritorio": st.session_state.dados_usuario.get("escritorio", "Global"),
+                    "area": area,
+                    "responsavel": st.session_state.usuario,
+                    "link_material": link_material,
+                    "data_cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
+                if enviar_dados_para_planilha("Processo", novo):
+                    recarregar_aba("Processo", "Processo cadastrado com sucesso!")
+
+@st.fragment
+def edicao_processo(processos, clientes):
+    numeros = processos["numero"].tolist()
+    if not numeros:
+        st.info("Não há processos para editar.")
+        return
+    selecionado = st.selectbox("Selecione o processo para editar/excluir", numeros, key="sel_proc")
+    proc = buscar_processo_por_numero(selecionado, processos)
+    if not proc:
+        return
+    st.subheader(f"📝 Editando Processo: {selecionado}")
+    # Processos anteriores ao `cliente_chave`: a chave vem do cadastro só se o
+    # nome bater exatamente com um único cliente; senão fica vazia até o
+    # usuário escolher o cliente na busca.
+    nome_cliente = proc.get("cliente", "")
+    chave_cliente = proc.get("cliente_chave") or indice_clientes(clientes).chave_do_nome(nome_cliente) or ""
+    cli_edit = seletor_cliente(
+        clientes, "Cliente", key=f"edicao_cliente_{selecionado}", atual=(chave_cliente, nome_cliente)
+    )
+    desc_edit = st.text_area("Descrição", value=proc.get("descricao",""))
+    status_opts = ["🔴 Atrasado","🟡 Atenção","🟢 Normal","🔵 Movimentado","⚫ Encerrado"]
+    idx = status_opts.index(
+        calcular_status_processo(
+            converter_data(proc.get("prazo")),
+            proc.get("houve_movimentacao", False),
+            proc.get("encerrado", False)
+        )
+    ) if pd.notna(proc.get("prazo")) else 2
+    stat_edit = st.selectbox("Status", status_opts, index=idx)
+    link_edit = st.text_input("Link do Material (opcional)", value=proc.get("link_material",""))
+
+    col_upd, col_del = st.columns(2)
+    with col_upd:
+        if st.button("Atualizar Processo", key="btn_atualiza"):
+            dados_upd = {
+                "cliente": cli_edit[1] if cli_edit else "",
+                "cliente_chave": cli_edit[0] if cli_edit else "",
+                "descricao": desc_edit,
+                "status_manual": stat_edit,
+                "link_material": link_edit
+            }
+            if atualizar_processo(selecionado, dados_upd):
+                recarregar_aba("Processo", "Processo atualizado com sucesso!")
+            else:
+                st.error("Falha ao atualizar processo.")
+    with col_del:
+        if st.button("Excluir Processo", key="btn_exclui"):
+            if excluir_processo(selecionado):
+                recarregar_aba("Processo", "Processo excluído com sucesso!")
+            else:
+                st.error("Falha ao excluir processo.")
+
+@st.fragment
+def consulta_historico(historico):
+    num_proc = st.text_input("Digite o número do processo para consultar o histórico")
+    if num_proc:
+        historico_filtrado = historico[historico["numero"] == num_proc]
+        if not historico_filtrado.empty:
+            st.write(f"{len(historico_filtrado)} registro(s) encontrado(s) para o processo {num_proc}:")
+            for item in historico_filtrado.to_dict("records"):
+                with st.expander(f"{item['tipo']} - {item['data']} - {item.get('cliente_associado', '')}"):
+                    st.write(f"**Responsável:** {item['responsavel']}")
+                    st.write(f"**Escritório:** {item.get('escritorio', '')}")
+                    st.text_area("Conteúdo", value=item.get("conteudo", ""), key=item["data"], disabled=True)
+        else:
+            st.info("Nenhum histórico encontrado para esse processo.")
+
+@st.fragment
+def formulario_funcionario(escritorios):
+    with st.form("form_funcionario"):
+        nome = st.text_input("Nome Completo*")
+        email = st.text_input("E-mail*")
+        telefone = st.text_input("Telefone*")
+        usuario_novo = st.text_input("Usuário*")
+        senha_novo = st.text_input("Senha*", type="password")
+        escritorio = st.selectbox("Escritório*", [e["nome"] for e in escritorios] or ["Global"])
+        area_atuacao = st.selectbox("Área de Atuação*", ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário", "Todas"])
+        papel_func = st.selectbox("Papel no Sistema*", ["manager", "lawyer", "assistant"])
+        if st.form_submit_button("Cadastrar Funcionário"):
+            if not nome or not email or not telefone or not usuario_novo or not senha_novo:
+                st.warning("Campos obrigatórios não preenchidos!")
+            else:
+                novo_funcionario = {"nome": nome,
+                                    "email": email,
+                                    "telefone": telefone,
+                                    "usuario": usuario_novo,
+                                    "senha": senha_novo,
+                                    "escritorio": escritorio,
+                                    "area": area_atuacao,
+                                    "papel": papel_func,
+                                    "data_cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                    "cadastrado_por": st.session_state.usuario}
+                if enviar_dados_para_planilha("Funcionario", novo_funcionario):
+                    recarregar_aba("Funcionario", "Funcionário cadastrado com sucesso!")
+
+@st.fragment
+def formulario_escritorio():
+    with st.form("form_escritorio"):
+        st.subheader("Dados Cadastrais")
+        nome = st.text_input("Nome do Escritório*")
+        endereco = st.text_input("Endereço Completo*")
+        telefone = st.text_input("Telefone*")
+        email = st.text_input("E-mail*")
+        cnpj = st.text_input("CNPJ*")
+        st.subheader("Responsável Técnico")
+        responsavel_tecnico = st.text_input("Nome do Responsável Técnico*")
+        telefone_tecnico = st.text_input("Telefone do Responsável*")
+        email_tecnico = st.text_input("E-mail do Responsável*")
+        area_atuacao = st.multiselect("Áreas de Atuação", ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário"])
+        if st.form_submit_button("Salvar Escritório"):
+            campos_obrigatorios = [nome, endereco, telefone, email, cnpj, responsavel_tecnico, telefone_tecnico, email_tecnico]
+            if not all(campos_obrigatorios):
+                st.warning("Todos os campos obrigatórios (*) devem ser preenchidos!")
+            else:
+                novo_escritorio = {"nome": nome,
+                                   "endereco": endereco,
+                                   "telefone": telefone,
+                                   "email": email,
+                                   "cnpj": cnpj,
+                                   "data_cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                   "responsavel": st.session_state.usuario,
+                                   "responsavel_tecnico": responsavel_tecnico,
+                                   "telefone_tecnico": telefone_tecnico,
+                                   "email_tecnico": email_tecnico,
+                                   "area_atuacao": ", ".join(area_atuacao)}
+                if enviar_dados_para_planilha("Escritorio", novo_escritorio):
+                    recarregar_aba("Escritorio", "Escritório cadastrado com sucesso!")
+
+@st.fragment
+def gerenciar_permissoes(funcionarios):
+    df_func = pd.DataFrame(funcionarios)
+    st.dataframe(df_func)
+    funcionario_selecionado = st.selectbox("Funcionário", df_func["nome"].tolist())
+    novas_areas = st.multiselect(
+        "Áreas Permitidas",
+        ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário"]
+    )
+    if st.button("Atualizar Permissões"):
+        if any(f.get("nome") == funcionario_selecionado for f in funcionarios):
+            payload = {
+                "nome": funcionario_selecionado,
+                "area": ", ".join(novas_areas),
+                "atualizar": True
+            }
+            sucesso = enviar_dados_para_planilha("Funcionario", payload)
+            if sucesso:
+                recarregar_aba("Funcionario", "Permissões atualizadas com sucesso!")
+            else:
+                st.error("Falha ao atualizar permissões.")
 
 
 ##############################
@@ -265,6 +919,8 @@ def buscar_processo_por_numero(numero, processos):
 ##############################
 def main():
     st.title("Sistema Jurídico - Fernanda Freitas")
+    if "mensagem_sucesso" in st.session_state:
+        st.success(st.session_state.pop("mensagem_sucesso"))
     
     # 1) carrega apenas os funcionários da planilha
     usuarios_planilha = carregar_usuarios_da_planilha()
@@ -274,14 +930,12 @@ def main():
     st.session_state.USERS.update(usuarios_planilha)
     
     # Carrega os dados de cada aba
-    CLIENTES = carregar_dados_da_planilha("Cliente") or []
-    PROCESSOS = carregar_dados_da_planilha("Processo") or []
-    ESCRITORIOS = carregar_dados_da_planilha("Escritorio") or []
-    HISTORICO_PETICOES = carregar_dados_da_planilha("Historico_Peticao")
-    if not isinstance(HISTORICO_PETICOES, list):
-        HISTORICO_PETICOES = []
-    FUNCIONARIOS = carregar_dados_da_planilha("Funcionario") or []
-    LEADS = carregar_dados_da_planilha("Lead") or []
+    CLIENTES = obter_tabela("Cliente")
+    PROCESSOS = obter_tabela("Processo")
+    ESCRITORIOS = obter_registros("Escritorio")
+    HISTORICO_PETICOES = obter_tabela("Historico_Peticao")
+    FUNCIONARIOS = obter_registros("Funcionario")
+    LEADS = obter_registros("Lead")
     LEADS = LEADS if isinstance(LEADS, list) else [LEADS]
     
     #####################
@@ -305,7 +959,8 @@ def main():
             for key in ["usuario", "papel", "dados_usuario"]:
                 st.session_state.pop(key, None)
             st.sidebar.success("Você saiu do sistema!")
-            st.experimental_rerun()
+            st.rerun()
+    exibir_estado_apps_script()
     
     #####################
     # Interface: Se o usuário está logado
@@ -319,6 +974,8 @@ def main():
         
         # Menu Principal (incluindo "Gestão de Leads")
         opcoes = ["Dashboard", "Clientes", "Processos", "Históricos", "Gerenciar Funcionários"]
+        if papel in ("owner", "manager"):
+            opcoes.insert(1, "Financeiro")
         if papel == "owner":
             opcoes.extend(["Gerenciar Escritórios", "Gerenciar Permissões"])
         elif papel == "manager":
@@ -330,164 +987,43 @@ def main():
         #######################################
         if escolha == "Dashboard":
             st.subheader("📋 Painel de Controle de Processos")
-        
-            # ── Filtros ──
-            with st.expander("🔍 Filtros", expanded=True):
-                col1, col2, col3 = st.columns(3)
-                filtro_area = area_fixa or col1.selectbox(
-                    "Área",
-                    ["Todas"] + sorted({p["area"] for p in PROCESSOS})
-                )
-                filtro_status = col2.selectbox(
-                    "Status",
-                    ["Todos", "🔴 Atrasado", "🟡 Atenção", "🟢 Normal", "🔵 Movimentado", "⚫ Encerrado"]
-                )
-                filtro_escritorio = col3.selectbox(
-                    "Escritório",
-                    ["Todos"] + sorted({p["escritorio"] for p in PROCESSOS})
-                )
 
             # ── Aniversariantes do Dia ──
             hoje = datetime.date.today()
-            aniversariantes = []
-            for cliente in CLIENTES:
-                data_aniversario = converter_data(cliente.get("aniversario", ""))
-                if data_aniversario.month == hoje.month and data_aniversario.day == hoje.day:
-                    aniversariantes.append((cliente.get("nome", "N/A"), data_aniversario))
+            aniversarios = CLIENTES["aniversario"]
+            aniversariantes = CLIENTES[(aniversarios.dt.month == hoje.month) & (aniversarios.dt.day == hoje.day)]
 
             st.markdown("### 🎂 Aniversariantes do Dia")
-            if aniversariantes:
-                for nome, data in aniversariantes:
-                    st.write(f"{nome} — {data.strftime('%d/%m/%Y')}")
+            if not aniversariantes.empty:
+                for nome, data in aniversariantes[["nome", "aniversario"]].itertuples(index=False):
+                    st.write(f"{nome or 'N/A'} — {data.strftime('%d/%m/%Y')}")
             else:
                 st.info("Nenhum aniversariante para hoje.")
-                
-            # ── Aplica filtros ──
-            processos_visiveis = PROCESSOS.copy()
-            if area_fixa:
-                processos_visiveis = [p for p in processos_visiveis if p["area"] == area_fixa]
-            elif filtro_area != "Todas":
-                processos_visiveis = [p for p in processos_visiveis if p["area"] == filtro_area]
-        
-            if filtro_status != "Todos":
-                if filtro_status == "⚫ Encerrado":
-                    processos_visiveis = [p for p in processos_visiveis if p.get("encerrado", False)]
-                else:
-                    processos_visiveis = [
-                        p for p in processos_visiveis
-                        if calcular_status_processo(
-                            converter_data(p.get("prazo")),
-                            p.get("houve_movimentacao", False),
-                            p.get("encerrado", False)
-                        ) == filtro_status
-                    ]
-        
-            if filtro_escritorio != "Todos":
-                processos_visiveis = [p for p in processos_visiveis if p["escritorio"] == filtro_escritorio]
-        
-            # ── Métricas ──
-            st.subheader("📊 Visão Geral")
-            total = len(processos_visiveis)
-            atrasados = len([p for p in processos_visiveis
-                             if calcular_status_processo(
-                                 converter_data(p.get("prazo")),
-                                 p.get("houve_movimentacao", False),
-                                 p.get("encerrado", False)
-                             ) == "🔴 Atrasado"])
-            atencao = len([p for p in processos_visiveis
-                           if calcular_status_processo(
-                               converter_data(p.get("prazo")),
-                               p.get("houve_movimentacao", False),
-                               p.get("encerrado", False)
-                           ) == "🟡 Atenção"])
-            movimentados = len([p for p in processos_visiveis if p.get("houve_movimentacao", False)])
-            encerrados = len([p for p in processos_visiveis if p.get("encerrado", False)])
-            c1, c2, c3, c4, c5 = st.columns(5)
-            c1.metric("Total", total)
-            c2.metric("Atrasados", atrasados)
-            c3.metric("Atenção", atencao)
-            c4.metric("Movimentados", movimentados)
-            c5.metric("Encerrados", encerrados)
-        
-            # ── Lista de Processos ──
-            st.subheader("📋 Lista de Processos")
-            if processos_visiveis:
-                cols = ["numero", "cliente", "area", "prazo", "responsavel", "link_material"]
-                df_proc = get_dataframe_with_cols(processos_visiveis, cols)
-                df_proc["Status"] = df_proc.apply(
-                    lambda r: calcular_status_processo(
-                        converter_data(r["prazo"]),
-                        r.get("houve_movimentacao", False),
-                        r.get("encerrado", False)
-                    ), axis=1
-                )
-                ordem = {"🔴 Atrasado": 0, "🟡 Atenção": 1, "🟢 Normal": 2, "🔵 Movimentado": 3, "⚫ Encerrado": 4}
-                df_proc = df_proc.assign(ord=df_proc["Status"].map(ordem)) \
-                                 .sort_values("ord") \
-                                 .drop("ord", axis=1)
-                df_proc["link_material"] = df_proc["link_material"].apply(
-                    lambda x: f"[Abrir Material]({x})" if x else ""
-                )
-                st.dataframe(df_proc)
-            else:
-                st.info("Nenhum processo encontrado com os filtros aplicados")
+
+            painel_processos(PROCESSOS, area_fixa)
         
+        # ------------------ Financeiro ------------------ #
+        elif escolha == "Financeiro":
+            st.subheader("💰 Análise Financeira dos Contratos")
+            painel_financeiro(PROCESSOS, area_fixa)
+
         # ------------------ Clientes ------------------ #
         elif escolha == "Clientes":
             st.subheader("👥 Cadastro de Clientes")
-            with st.form("form_cliente"):
-                nome       = st.text_input("Nome Completo*", key="nome_cliente")
-                email      = st.text_input("E-mail*")
-                telefone   = st.text_input("Telefone*")
-                aniversario = st.date_input("Data de Nascimento")
-                endereco   = st.text_input("Endereço*", placeholder="Rua, número, bairro, cidade, CEP")
-                escritorio = st.selectbox("Escritório", [e["nome"] for e in ESCRITORIOS] + ["Outro"])
-                observacoes = st.text_area("Observações")
-                if st.form_submit_button("Salvar Cliente"):
-                    if not nome or not email or not telefone or not endereco:
-                        st.warning("Campos obrigatórios não preenchidos!")
-                    else:
-                        novo_cliente = {
-                            "nome": nome,
-                            "email": email,
-                            "telefone": telefone,
-                            "aniversario": aniversario.strftime("%Y-%m-%d"),
-                            "endereco": endereco,
-                            "observacoes": observacoes,
-                            "cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "responsavel": st.session_state.usuario,
-                            "escritorio": escritorio
-                        }
-                        if enviar_dados_para_planilha("Cliente", novo_cliente):
-                            CLIENTES.append(novo_cliente)
-                            st.success("Cliente cadastrado com sucesso!")
+            formulario_cliente(ESCRITORIOS)
 
             st.subheader("Lista de Clientes")
-            if CLIENTES:
+            if not CLIENTES.empty:
                 df_cliente = get_dataframe_with_cols(
                     CLIENTES,
                     ["nome", "email", "telefone", "aniversario", "endereco", "cadastro"]
                 )
+                df_cliente["aniversario"] = df_cliente["aniversario"].dt.date
                 st.dataframe(df_cliente)
-
-                col_export1, col_export2 = st.columns(2)
-                with col_export1:
-                    if st.button("Exportar Clientes (TXT)"):
-                        txt = "\n".join([
-                            f'{c.get("nome","")} | {c.get("email","")} | {c.get("telefone","")}'
-                            for c in CLIENTES
-                        ])
-                        st.download_button("Baixar TXT", txt, file_name="clientes.txt")
-
-                with col_export2:
-                    if st.button("Exportar Clientes (PDF)"):
-                        texto_pdf = "\n".join([
-                            f'{c.get("nome","")} | {c.get("email","")} | {c.get("telefone","")}'
-                            for c in CLIENTES
-                        ])
-                        pdf_file = exportar_pdf(texto_pdf, nome_arquivo="clientes")
-                        with open(pdf_file, "rb") as f:
-                            st.download_button("Baixar PDF", f, file_name=pdf_file)
+                botoes_exportacao("Clientes", "clientes", lambda: "\n".join([
+                    f'{nome} | {email} | {telefone}'
+                    for nome, email, telefone in CLIENTES[["nome", "email", "telefone"]].itertuples(index=False)
+                ]))
             else:
                 st.info("Nenhum cliente cadastrado ainda")                  
         
@@ -495,58 +1031,16 @@ def main():
         elif escolha == "Processos":
             # 1) Formulário de cadastro
             st.subheader("📄 Cadastro de Processos")
-            with st.form("form_processo"):
-                cliente_nome    = st.text_input("Cliente*")
-                numero_processo = st.text_input("Número do Processo*")
-                tipo_contrato   = st.selectbox("Tipo de Contrato*", ["Fixo", "Por Ato", "Contingência"])
-                descricao       = st.text_area("Descrição do Caso*")
-                col1, col2      = st.columns(2)
-                with col1:
-                    valor_total = st.number_input("Valor Total (R$)*", min_value=0.0, format="%.2f")
-                with col2:
-                    valor_movimentado = st.number_input("Valor Movimentado (R$)", min_value=0.0, format="%.2f")
-                prazo_inicial   = st.date_input("Prazo Inicial*", value=datetime.date.today())
-                prazo_final     = st.date_input("Prazo Final*", value=datetime.date.today() + datetime.timedelta(days=30))
-                houve_mov       = st.checkbox("Houve movimentação recente?")
-                area            = st.selectbox("Área Jurídica*", ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário"])
-                link_material   = st.text_input("Link do Material Complementar (opcional)")
-                encerrado       = st.checkbox("Processo Encerrado?")
-                if st.form_submit_button("Salvar Processo"):
-                    if not (cliente_nome and numero_processo and descricao):
-                        st.warning("Campos obrigatórios (*) não preenchidos!")
-                    else:
-                        novo = {
-                            "cliente": cliente_nome,
-                            "numero": numero_processo,
-                            "contrato": tipo_contrato,
-                            "descricao": descricao,
-                            "valor_total": valor_total,
-                            "valor_movimentado": valor_movimentado,
-                            "prazo_inicial": prazo_inicial.strftime("%Y-%m-%d"),
-                            "prazo": prazo_final.strftime("%Y-%m-%d"),
-                            "houve_movimentacao": houve_mov,
-                            "encerrado": encerrado,
-                            "escritorio": st.session_state.dados_usuario.get("escritorio", "Global"),
-                            "area": area,
-                            "responsavel": st.session_state.usuario,
-                            "link_material": link_material,
-                            "data_cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        }
-                        if enviar_dados_para_planilha("Processo", novo):
-                            PROCESSOS.append(novo)
-                            st.success("Processo cadastrado com sucesso!")
+            formulario_processo(CLIENTES)
 
             # 2) Listagem
             st.subheader("Lista de Processos Cadastrados")
-            if PROCESSOS:
+            if not PROCESSOS.empty:
                 cols_proc = ["numero", "cliente", "area", "prazo", "responsavel", "link_material"]
                 df_proc = get_dataframe_with_cols(PROCESSOS, cols_proc)
-                df_proc["Status"] = df_proc.apply(
-                    lambda r: calcular_status_processo(
-                        converter_data(r["prazo"]),
-                        r.get("houve_movimentacao", False),
-                        r.get("encerrado", False)
-                    ), axis=1
+                df_proc["prazo"] = df_proc["prazo"].dt.date
+                df_proc["Status"] = status_processos_em_cache(
+                    PROCESSOS, PROCESSOS.attrs.get("versao", ""), datetime.date.today()
                 )
                 st.dataframe(df_proc)
             else:
@@ -554,68 +1048,13 @@ def main():
 
             # 3) Edição / Exclusão
             st.markdown("---")
-            numeros = [p["numero"] for p in PROCESSOS]
-            if numeros:
-                selecionado = st.selectbox("Selecione o processo para editar/excluir", numeros, key="sel_proc")
-                proc = buscar_processo_por_numero(selecionado, PROCESSOS)
-                if proc:
-                    st.subheader(f"📝 Editando Processo: {selecionado}")
-                    cli_edit = st.text_input("Cliente", value=proc.get("cliente",""))
-                    desc_edit = st.text_area("Descrição", value=proc.get("descricao",""))
-                    status_opts = ["🔴 Atrasado","🟡 Atenção","🟢 Normal","🔵 Movimentado","⚫ Encerrado"]
-                    idx = status_opts.index(
-                        calcular_status_processo(
-                            converter_data(proc.get("prazo")),
-                            proc.get("houve_movimentacao", False),
-                            proc.get("encerrado", False)
-                        )
-                    ) if proc.get("prazo") else 2
-                    stat_edit = st.selectbox("Status", status_opts, index=idx)
-                    link_edit = st.text_input("Link do Material (opcional)", value=proc.get("link_material",""))
-
-                    col_upd, col_del = st.columns(2)
-                    with col_upd:
-                        if st.button("Atualizar Processo", key="btn_atualiza"):
-                            dados_upd = {
-                                "cliente": cli_edit,
-                                "descricao": desc_edit,
-                                "status_manual": stat_edit,
-                                "link_material": link_edit
-                            }
-                            if atualizar_processo(selecionado, dados_upd):
-                                # refaz a lista em memória
-                                for p in PROCESSOS:
-                                    if p["numero"] == selecionado:
-                                        p.update(dados_upd)
-                                st.success("Processo atualizado com sucesso!")
-                            else:
-                                st.error("Falha ao atualizar processo.")
-                    with col_del:
-                        if st.button("Excluir Processo", key="btn_exclui"):
-                            if excluir_processo(selecionado):
-                                PROCESSOS[:] = [p for p in PROCESSOS if p["numero"] != selecionado]
-                                st.success("Processo excluído com sucesso!")
-                            else:
-                                st.error("Falha ao excluir processo.")
-            else:
-                st.info("Não há processos para editar.")
+            edicao_processo(PROCESSOS, CLIENTES)
 
         
         # ------------------ Históricos ------------------ #
         elif escolha == "Históricos":
             st.subheader("📜 Histórico de Processos + Consulta TJMG")
-            num_proc = st.text_input("Digite o número do processo para consultar o histórico")
-            if num_proc:
-                historico_filtrado = [h for h in HISTORICO_PETICOES if h.get("numero") == num_proc]
-                if historico_filtrado:
-                    st.write(f"{len(historico_filtrado)} registro(s) encontrado(s) para o processo {num_proc}:")
-                    for item in historico_filtrado:
-                        with st.expander(f"{item['tipo']} - {item['data']} - {item.get('cliente_associado', '')}"):
-                            st.write(f"**Responsável:** {item['responsavel']}")
-                            st.write(f"**Escritório:** {item.get('escritorio', '')}")
-                            st.text_area("Conteúdo", value=item.get("conteudo", ""), key=item["data"], disabled=True)
-                else:
-                    st.info("Nenhum histórico encontrado para esse processo.")
+            consulta_historico(HISTORICO_PETICOES)
             st.write("**Consulta TJMG (iframe)**")
             iframe_html = """
 <div style="overflow: auto; height:600px;">
@@ -630,49 +1069,16 @@ def main():
         # ------------------ Gerenciar Funcionários ------------------ #
         elif escolha == "Gerenciar Funcionários":
             st.subheader("👥 Cadastro de Funcionários")
-            with st.form("form_funcionario"):
-                nome = st.text_input("Nome Completo*")
-                email = st.text_input("E-mail*")
-                telefone = st.text_input("Telefone*")
-                usuario_novo = st.text_input("Usuário*")
-                senha_novo = st.text_input("Senha*", type="password")
-                escritorio = st.selectbox("Escritório*", [e["nome"] for e in ESCRITORIOS] or ["Global"])
-                area_atuacao = st.selectbox("Área de Atuação*", ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário", "Todas"])
-                papel_func = st.selectbox("Papel no Sistema*", ["manager", "lawyer", "assistant"])
-                if st.form_submit_button("Cadastrar Funcionário"):
-                    if not nome or not email or not telefone or not usuario_novo or not senha_novo:
-                        st.warning("Campos obrigatórios não preenchidos!")
-                    else:
-                        novo_funcionario = {"nome": nome,
-                                            "email": email,
-                                            "telefone": telefone,
-                                            "usuario": usuario_novo,
-                                            "senha": senha_novo,
-                                            "escritorio": escritorio,
-                                            "area": area_atuacao,
-                                            "papel": papel_func,
-                                            "data_cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                            "cadastrado_por": st.session_state.usuario}
-                        if enviar_dados_para_planilha("Funcionario", novo_funcionario):
-                            st.success("Funcionário cadastrado com sucesso!")
-                            st.session_state.USERS = carregar_usuarios_da_planilha()
+            formulario_funcionario(ESCRITORIOS)
             st.subheader("Lista de Funcionários")
             if FUNCIONARIOS:
                 funcionarios_visiveis = [f for f in FUNCIONARIOS if f.get("escritorio") == escritorio_usuario] if papel == "manager" else FUNCIONARIOS
                 if funcionarios_visiveis:
                     df_func = get_dataframe_with_cols(funcionarios_visiveis, ["nome", "email", "telefone", "usuario", "papel", "escritorio", "area"])
                     st.dataframe(df_func)
-                    col_export1, col_export2 = st.columns(2)
-                    with col_export1:
-                        if st.button("Exportar Funcionários (TXT)"):
-                            txt = "\n".join([f'{f.get("nome","")} | {f.get("email","")} | {f.get("telefone","")}' for f in funcionarios_visiveis])
-                            st.download_button("Baixar TXT", txt, file_name="funcionarios.txt")
-                    with col_export2:
-                        if st.button("Exportar Funcionários (PDF)"):
-                            texto_pdf = "\n".join([f'{f.get("nome","")} | {f.get("email","")} | {f.get("telefone","")}' for f in funcionarios_visiveis])
-                            pdf_file = exportar_pdf(texto_pdf, nome_arquivo="funcionarios")
-                            with open(pdf_file, "rb") as f:
-                                st.download_button("Baixar PDF", f, file_name=pdf_file)
+                    botoes_exportacao("Funcionários", "funcionarios", lambda: "\n".join(
+                        [f'{f.get("nome","")} | {f.get("email","")} | {f.get("telefone","")}' for f in funcionarios_visiveis]
+                    ))
                 else:
                     st.info("Nenhum funcionário cadastrado para este escritório")
             else:
@@ -683,52 +1089,14 @@ def main():
             st.subheader("🏢 Gerenciamento de Escritórios")
             tab1, tab2, tab3 = st.tabs(["Cadastrar Escritório", "Lista de Escritórios", "Administradores"])
             with tab1:
-                with st.form("form_escritorio"):
-                    st.subheader("Dados Cadastrais")
-                    nome = st.text_input("Nome do Escritório*")
-                    endereco = st.text_input("Endereço Completo*")
-                    telefone = st.text_input("Telefone*")
-                    email = st.text_input("E-mail*")
-                    cnpj = st.text_input("CNPJ*")
-                    st.subheader("Responsável Técnico")
-                    responsavel_tecnico = st.text_input("Nome do Responsável Técnico*")
-                    telefone_tecnico = st.text_input("Telefone do Responsável*")
-                    email_tecnico = st.text_input("E-mail do Responsável*")
-                    area_atuacao = st.multiselect("Áreas de Atuação", ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário"])
-                    if st.form_submit_button("Salvar Escritório"):
-                        campos_obrigatorios = [nome, endereco, telefone, email, cnpj, responsavel_tecnico, telefone_tecnico, email_tecnico]
-                        if not all(campos_obrigatorios):
-                            st.warning("Todos os campos obrigatórios (*) devem ser preenchidos!")
-                        else:
-                            novo_escritorio = {"nome": nome,
-                                               "endereco": endereco,
-                                               "telefone": telefone,
-                                               "email": email,
-                                               "cnpj": cnpj,
-                                               "data_cadastro": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                               "responsavel": st.session_state.usuario,
-                                               "responsavel_tecnico": responsavel_tecnico,
-                                               "telefone_tecnico": telefone_tecnico,
-                                               "email_tecnico": email_tecnico,
-                                               "area_atuacao": ", ".join(area_atuacao)}
-                            if enviar_dados_para_planilha("Escritorio", novo_escritorio):
-                                ESCRITORIOS.append(novo_escritorio)
-                                st.success("Escritório cadastrado com sucesso!")
+                formulario_escritorio()
             with tab2:
                 if ESCRITORIOS:
                     df_esc = get_dataframe_with_cols(ESCRITORIOS, ["nome", "endereco", "telefone", "email", "cnpj"])
                     st.dataframe(df_esc)
-                    col_exp1, col_exp2 = st.columns(2)
-                    with col_exp1:
-                        if st.button("Exportar Escritórios (TXT)"):
-                            txt = "\n".join([f'{e.get("nome", "")} | {e.get("endereco", "")} | {e.get("telefone", "")}' for e in ESCRITORIOS])
-                            st.download_button("Baixar TXT", txt, file_name="escritorios.txt")
-                    with col_exp2:
-                        if st.button("Exportar Escritórios (PDF)"):
-                            txt_exp = "\n".join([f'{e.get("nome", "")} | {e.get("endereco", "")} | {e.get("telefone", "")}' for e in ESCRITORIOS])
-                            pdf_file = exportar_pdf(txt_exp, nome_arquivo="escritorios")
-                            with open(pdf_file, "rb") as f:
-                                st.download_button("Baixar PDF", f, file_name=pdf_file)
+                    botoes_exportacao("Escritórios", "escritorios", lambda: "\n".join(
+                        [f'{e.get("nome", "")} | {e.get("endereco", "")} | {e.get("telefone", "")}' for e in ESCRITORIOS]
+                    ))
                 else:
                     st.info("Nenhum escritório cadastrado ainda")
             with tab3:
@@ -740,34 +1108,7 @@ def main():
             st.subheader("🔧 Gerenciar Permissões de Funcionários")
             st.info("Configure as áreas de atuação do funcionário.")
             if FUNCIONARIOS:
-                df_func = pd.DataFrame(FUNCIONARIOS)
-                st.dataframe(df_func)
-                funcionario_selecionado = st.selectbox("Funcionário", df_func["nome"].tolist())
-                novas_areas = st.multiselect(
-                    "Áreas Permitidas",
-                    ["Cível", "Criminal", "Trabalhista", "Previdenciário", "Tributário"]
-                )
-                if st.button("Atualizar Permissões"):
-                    atualizado = False
-                    # renomeei as variáveis para evitar shadowing
-                    for idx, funcionario_item in enumerate(FUNCIONARIOS):
-                        if funcionario_item.get("nome") == funcionario_selecionado:
-                            FUNCIONARIOS[idx]["area"] = ", ".join(novas_areas)
-                            atualizado = True
-                            for key, usuario_item in st.session_state.USERS.items():
-                                if usuario_item.get("username") == funcionario_item.get("usuario"):
-                                    st.session_state.USERS[key]["area"] = ", ".join(novas_areas)
-                    if atualizado:
-                        payload = {
-                            "nome": funcionario_selecionado,
-                            "area": ", ".join(novas_areas),
-                            "atualizar": True
-                        }
-                        sucesso = enviar_dados_para_planilha("Funcionario", payload)
-                        if sucesso:
-                            st.success("Permissões atualizadas com sucesso!")
-                        else:
-                            st.error("Falha ao atualizar permissões.")
+                gerenciar_permissoes(FUNCIONARIOS)
             else:
                 st.info("Nenhum funcionário cadastrado.")
     
@@ -0,0 +1,87 @@
+"""
+Índice de busca de clientes por nome, para o seletor de cliente do cadastro
+de processos.
+
+Os nomes são normalizados (sem acentos, minúsculos) e indexados de duas formas:
+uma lista ordenada de palavras, para busca por prefixo com bisect, e listas de
+ocorrência de trigramas em arrays numpy, para a busca aproximada. A pontuação
+de cada consulta é calculada de forma vetorizada sobre todos os clientes.
+"""
+import bisect
+import unicodedata
+from collections import defaultdict
+import numpy as np
+
+def dobrar_texto(texto):
+    """Remove acentos, converte para minúsculas e normaliza os espaços."""
+    decomposto = unicodedata.normalize("NFKD", str(texto))
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.lower().split())
+
+def trigramas(texto):
+    preenchido = f"  {texto} "
+    return {preenchido[i:i + 3] for i in range(len(preenchido) - 2)}
+
+class IndiceClientes:
+    """Índice de prefixo + trigramas sobre os nomes dos clientes."""
+
+    def __init__(self, chaves, nomes):
+        self.chaves = list(chaves)
+        self.nomes = list(nomes)
+        ocorrencias = defaultdict(list)
+        self._por_nome = defaultdict(list)
+        palavras = []
+        self._tamanhos = np.zeros(len(self.nomes), dtype=np.int32)
+        for i, nome in enumerate(self.nomes):
+            dobrado = dobrar_texto(nome)
+            self._por_nome[dobrado].append(i)
+            tris = trigramas(dobrado)
+            self._tamanhos[i] = len(tris)
+            for tri in tris:
+                ocorrencias[tri].append(i)
+            palavras.extend((palavra, i) for palavra in set(dobrado.split()))
+        self._ocorrencias = {tri: np.array(ids, dtype=np.int32) for tri, ids in ocorrencias.items()}
+        palavras.sort()
+        self._palavras = [palavra for palavra, _ in palavras]
+        self._ids_palavras = np.array([i for _, i in palavras], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def chave_do_nome(self, nome):
+        """
+        Chave do único cliente cujo nome é igual a `nome` (ignorando acentos,
+        maiúsculas e espaços), ou None se não houver nenhum ou houver homônimos.
+        """
+        ids = self._por_nome.get(dobrar_texto(nome), [])
+        return self.chaves[ids[0]] if len(ids) == 1 else None
+
+    def _ids_com_prefixo(self, prefixo):
+        inicio = bisect.bisect_left(self._palavras, prefixo)
+        fim = bisect.bisect_left(self._palavras, prefixo + "\uffff")
+        return self._ids_palavras[inicio:fim]
+
+    def buscar(self, consulta, limite=10):
+        """
+        Retorna até `limite` tuplas (chave, nome, pontuação), da melhor para a pior.
+        A pontuação soma a similaridade de Jaccard dos trigramas (0 a 1) à fração
+        das palavras da consulta que são prefixo de alguma palavra do nome (0 a 1).
+        """
+        consulta = dobrar_texto(consulta)
+        if not consulta or not self.nomes:
+            return []
+        tris = trigramas(consulta)
+        listas = [self._ocorrencias[tri] for tri in tris if tri in self._ocorrencias]
+        if listas:
+            comuns = np.bincount(np.concatenate(listas), minlength=len(self.nomes))
+        else:
+            comuns = np.zeros(len(self.nomes), dtype=np.int64)
+        pontuacao = comuns / (len(tris) + self._tamanhos - comuns)
+        termos = consulta.split()
+        for termo in termos:
+            pontuacao[self._ids_com_prefixo(termo)] += 1.0 / len(termos)
+        candidatos = np.flatnonzero(pontuacao > 0)
+        if len(candidatos) > limite:
+            candidatos = candidatos[np.argpartition(-pontuacao[candidatos], limite)[:limite]]
+        candidatos = candidatos[np.argsort(-pontuacao[candidatos], kind="stable")]
+        return [(self.chaves[i], self.nomes[i], float(pontuacao[i])) for i in candidatos]
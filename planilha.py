@@ -0,0 +1,215 @@
+"""
+Leitura das abas da planilha pelo Google Apps Script: requisição (pela camada
+de resiliência), parse do formato colunar e tipagem das colunas.
+
+Não depende do Streamlit, para ser usado tanto pelo app quanto pelo
+atualizador de snapshots (`python snapshot.py`).
+"""
+import json
+import itertools
+import httpx
+import requests
+import numpy as np
+import pandas as pd
+import resiliencia
+
+# Configuração do Google Apps Script
+GAS_WEB_APP_URL = "https://script.google.com/macros/s/AKfycbzx0HbjObfhgU4lqVFBI05neopT-rb5tqlGbJU19EguKq8LmmtzkTPtZjnMgCNmz8OtLw/exec"
+
+# Camada de resiliência do Apps Script (latências, hedge e disjuntor),
+# compartilhada por todas as sessões do processo.
+CLIENTE_GAS = resiliencia.ClienteResiliente(
+    excecoes_timeout=(TimeoutError, requests.exceptions.Timeout, httpx.TimeoutException)
+)
+
+# -------------------- Esquemas das Abas --------------------
+# Tipos das colunas das abas carregadas no formato colunar. Colunas ausentes na
+# resposta são criadas vazias, para que o restante do app possa contar com elas.
+ESQUEMAS_ABAS = {
+    "Processo": {
+        "numero": "texto",
+        "cliente": "texto",
+        "contrato": "categoria",
+        "descricao": "texto",
+        "valor_total": "numero",
+        "valor_movimentado": "numero",
+        "prazo_inicial": "data",
+        "prazo": "data",
+        "houve_movimentacao": "booleano",
+        "encerrado": "booleano",
+        "escritorio": "categoria",
+        "area": "categoria",
+        "responsavel": "categoria",
+        "link_material": "texto",
+        "data_cadastro": "data",
+        "cliente_chave": "texto"
+    },
+    "Cliente": {
+        "nome": "texto",
+        "email": "texto",
+        "telefone": "texto",
+        "aniversario": "data",
+        "endereco": "texto",
+        "observacoes": "texto",
+        "cadastro": "texto",
+        "responsavel": "categoria",
+        "escritorio": "categoria"
+    },
+    "Historico_Peticao": {
+        "numero": "texto",
+        "tipo": "categoria",
+        "data": "texto",
+        "cliente_associado": "texto",
+        "responsavel": "categoria",
+        "escritorio": "categoria",
+        "conteudo": "texto"
+    }
+}
+
+VALORES_VERDADEIROS = {"true", "1", "sim", "s", "x", "yes"}
+
+def requisitar_planilha(tipo, debug=False, retries=3, timeout=30, params=None, stream=False):
+    """
+    Faz o GET ao Google Apps Script para a aba `tipo` pela camada de resiliência:
+    até `retries` tentativas, todas dentro de `timeout` segundos, com timeout
+    adaptativo e requisição duplicada acima do p95 da aba. Retorna o Response
+    ou lança resiliencia.ServicoIndisponivel.
+    """
+    def requisicao(limite):
+        response = requests.get(
+            GAS_WEB_APP_URL,
+            params={"tipo": tipo, **(params or {})},
+            headers={"Accept-Encoding": "gzip"},
+            timeout=limite,
+            stream=stream
+        )
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    response = CLIENTE_GAS.executar(f"GET {tipo}", requisicao, tentativas=retries, teto_timeout=timeout)
+    if debug:
+        print(f"[DEBUG] URL: {response.url}")
+        if not stream:
+            print(f"[DEBUG] Resposta (primeiros 500 chars): {response.text[:500]}")
+    return response
+
+# Linhas do formato colunar decodificadas por chamada a json.loads
+TAMANHO_LOTE = 5000
+
+def _texto(valores):
+    if set(map(type, valores)) <= {str}:
+        return np.array(valores, dtype=object)
+    return np.array(["" if v is None else str(v) for v in valores], dtype=object)
+
+def _tipar_coluna(valores, tipo_coluna):
+    """Converte uma sequência de valores brutos em um array numpy do tipo da coluna."""
+    if tipo_coluna == "numero":
+        try:
+            numeros = np.array(valores, dtype="float64")
+        except (TypeError, ValueError):
+            numeros = pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce").to_numpy("float64")
+        return np.nan_to_num(numeros, nan=0.0)
+    if tipo_coluna == "data":
+        # Converte só os valores distintos (datas se repetem muito numa aba)
+        codigos, distintos = pd.factorize(pd.Series(valores, dtype=object).replace("", None))
+        datas = pd.to_datetime(pd.Index(distintos, dtype=object), errors="coerce", utc=True, format="ISO8601")
+        datas = datas.tz_convert(None).normalize()
+        return datas.take(codigos, allow_fill=True, fill_value=pd.NaT).to_numpy()
+    if tipo_coluna == "booleano":
+        verdadeiros = {
+            v: v if isinstance(v, bool) else str(v).strip().lower() in VALORES_VERDADEIROS
+            for v in set(valores)
+        }
+        return np.array([verdadeiros[v] for v in valores], dtype=bool)
+    return _texto(valores)
+
+def _juntar_partes(partes, tipo_coluna):
+    if not partes:
+        partes = [_tipar_coluna([], tipo_coluna)]
+    valores = partes[0] if len(partes) == 1 else np.concatenate(partes)
+    if tipo_coluna == "categoria":
+        return pd.Categorical(valores)
+    return valores
+
+def _coluna(valores, tipo_coluna):
+    return _juntar_partes([_tipar_coluna(valores, tipo_coluna)], tipo_coluna)
+
+def montar_tabela(tipo, colunas):
+    """
+    Monta um DataFrame a partir de um dict {coluna: valores}, com colunas já
+    tipadas (como as de `ler_resposta_colunar`) ou listas de valores brutos,
+    aplicando o esquema de ESQUEMAS_ABAS[tipo] e criando as colunas ausentes.
+    """
+    esquema = ESQUEMAS_ABAS.get(tipo, {})
+    tamanho = len(next(iter(colunas.values()), []))
+    dados = {}
+    for nome, valores in colunas.items():
+        if isinstance(valores, (list, tuple)):
+            valores = _coluna(valores, esquema.get(nome, "texto"))
+        dados[nome] = valores
+    for nome, tipo_coluna in esquema.items():
+        if nome not in dados:
+            dados[nome] = _coluna([None] * tamanho, tipo_coluna)
+    return pd.DataFrame(dados, index=pd.RangeIndex(tamanho))
+
+def _ler_lote(lote, colunas, tipos):
+    # Um único json.loads para o lote inteiro, transposto em colunas.
+    registros = json.loads(b"[" + b",".join(lote) + b"]")
+    if set(map(len, registros)) - {len(colunas)}:
+        registros = [(r + [None] * len(colunas))[:len(colunas)] for r in registros]
+    for partes, tipo_coluna, valores in zip(colunas, tipos, zip(*registros)):
+        partes.append(_tipar_coluna(valores, tipo_coluna))
+
+def ler_resposta_colunar(linhas, esquema=None):
+    """
+    Lê o formato compacto do Apps Script (linhas em bytes, como em
+    `response.iter_lines()`): a primeira linha é o cabeçalho (lista
+    de nomes de colunas) e cada linha seguinte é a lista de valores de um registro.
+    As linhas são decodificadas em lotes de TAMANHO_LOTE e cada lote vira um
+    pedaço tipado (array numpy) de cada coluna, conforme `esquema`
+    ({coluna: tipo}, ver ESQUEMAS_ABAS); sem dicts por registro nem listas de
+    objetos do tamanho da aba.
+    Se a resposta vier no formato antigo (lista de objetos), faz o parse completo.
+    Retorna um dict {coluna: valores tipados}. Qualquer outra resposta (por
+    exemplo, um objeto de erro do Apps Script) lança ValueError.
+    """
+    esquema = esquema or {}
+    linhas = iter(linhas)
+    primeira = next((l for l in linhas if l.strip()), b"")
+    try:
+        cabecalho = json.loads(primeira)
+    except ValueError:
+        cabecalho = None
+    if not isinstance(cabecalho, list) or not all(isinstance(c, str) for c in cabecalho):
+        texto = b"\n".join([primeira, *linhas])
+        registros = json.loads(texto) if texto.strip() else []
+        if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+            raise ValueError(f"Resposta inesperada do Apps Script: {texto[:200]!r}")
+        cabecalho = list(dict.fromkeys(k for r in registros for k in r))
+        return {c: _coluna([r.get(c) for r in registros], esquema.get(c, "texto")) for c in cabecalho}
+    tipos = [esquema.get(c, "texto") for c in cabecalho]
+    colunas = [[] for _ in cabecalho]
+    linhas = filter(bytes.strip, linhas)
+    while lote := list(itertools.islice(linhas, TAMANHO_LOTE)):
+        _ler_lote(lote, colunas, tipos)
+    return {c: _juntar_partes(partes, t) for c, partes, t in zip(cabecalho, colunas, tipos)}
+
+def buscar_tabela_da_planilha(tipo, debug=False, retries=3, timeout=30):
+    """
+    Carrega uma aba no formato colunar compacto (`formato=colunar`, com gzip) e
+    retorna um DataFrame já tipado conforme ESQUEMAS_ABAS. Falhas lançam exceção.
+    """
+    response = requisitar_planilha(
+        tipo, debug=debug, retries=retries, timeout=timeout,
+        params={"formato": "colunar"}, stream=True
+    )
+    esquema = ESQUEMAS_ABAS.get(tipo, {})
+    with response:
+        colunas = ler_resposta_colunar(response.iter_lines(), esquema)
+    if esquema and colunas and not set(colunas) & set(esquema):
+        raise ValueError(f"Resposta do Apps Script sem as colunas da aba '{tipo}': {list(colunas)[:10]}")
+    return montar_tabela(tipo, colunas)
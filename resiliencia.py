@@ -0,0 +1,358 @@
+"""
+Camada de resiliência para as chamadas ao Google Apps Script.
+
+Cada chave (ex.: "GET Processo", "POST Cliente") tem suas próprias estatísticas
+de latência, usadas para definir o timeout das requisições e o momento de
+disparar uma requisição duplicada (hedge) quando a primeira passa do p95, e seu
+próprio disjuntor, que abre após falhas consecutivas: uma aba lenta não bloqueia
+as demais, e leituras não bloqueiam gravações. Um disjuntor de serviço, só para
+leituras, abre quando abas diferentes falham em sequência; enquanto ele ou o
+disjuntor da chave estiver aberto, as chamadas falham na hora, para que o app
+possa exibir os últimos dados válidos em vez de esperar.
+
+As leituras rodam num pool de threads por chave. O timeout e a latência
+contam a partir do início da requisição, não do tempo na fila, e uma
+requisição que nem chega a começar dentro do prazo (FilaCheia) não conta
+como falha do serviço.
+"""
+import time
+import threading
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+MIN_AMOSTRAS = 5
+
+class ServicoIndisponivel(Exception):
+    """Circuito aberto ou todas as tentativas dentro do prazo falharam."""
+
+class FilaCheia(ServicoIndisponivel):
+    """A requisição não começou dentro do prazo: todos os workers da chave estavam ocupados."""
+
+class EstatisticasLatencia:
+    """Janela deslizante das últimas latências (em segundos) de uma chave."""
+
+    def __init__(self, tamanho=50):
+        self._amostras = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos):
+        with self._lock:
+            self._amostras.append(segundos)
+
+    def percentil(self, p):
+        """Percentil `p` (0-100) pelo método do posto mais próximo, ou None se houver poucas amostras."""
+        with self._lock:
+            amostras = sorted(self._amostras)
+        if len(amostras) < MIN_AMOSTRAS:
+            return None
+        posto = max(0, min(len(amostras) - 1, int(round(p / 100 * len(amostras))) - 1))
+        return amostras[posto]
+
+    def __len__(self):
+        return len(self._amostras)
+
+class Disjuntor:
+    """
+    Disjuntor clássico: fechado -> aberto após `limite_falhas` falhas seguidas;
+    aberto -> semiaberto após `tempo_recuperacao` segundos, liberando uma única
+    chamada de teste; o resultado dela fecha ou reabre o circuito.
+    """
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    SEMIABERTO = "semiaberto"
+
+    def __init__(self, limite_falhas=3, tempo_recuperacao=30):
+        self.limite_falhas = limite_falhas
+        self.tempo_recuperacao = tempo_recuperacao
+        self.falhas_seguidas = 0
+        self.aberto_em = None
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.aberto_em is None:
+            return self.FECHADO
+        if time.monotonic() - self.aberto_em >= self.tempo_recuperacao:
+            return self.SEMIABERTO
+        return self.ABERTO
+
+    def segundos_para_teste(self):
+        if self.aberto_em is None:
+            return 0
+        return max(0, self.tempo_recuperacao - (time.monotonic() - self.aberto_em))
+
+    def permite(self):
+        with self._lock:
+            estado = self.estado
+            if estado == self.FECHADO:
+                return True
+            if estado == self.SEMIABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas_seguidas = 0
+            self.aberto_em = None
+            self._teste_em_andamento = False
+
+    def liberar_teste(self):
+        # A chamada liberada por `permite` não chegou a ser feita.
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self._teste_em_andamento or self.falhas_seguidas >= self.limite_falhas:
+                self.aberto_em = time.monotonic()
+            self._teste_em_andamento = False
+
+def _descartar(futuro):
+    # Resposta de uma requisição perdedora do hedge: libera a conexão.
+    if not futuro.cancelled() and futuro.exception() is None:
+        resultado, _ = futuro.result()
+        if hasattr(resultado, "close"):
+            resultado.close()
+
+def _abandonar(futuros):
+    # Cancela as requisições que ainda não começaram; as que já estão em
+    # andamento têm a resposta descartada quando terminarem.
+    for futuro in futuros:
+        if not futuro.cancel():
+            futuro.add_done_callback(_descartar)
+
+class ClienteResiliente:
+    """
+    Executa requisições com timeout adaptativo, hedge e disjuntor, e guarda o
+    último valor válido de cada chave para ser exibido quando o serviço falhar.
+    """
+
+    def __init__(self, timeout_minimo=3, timeout_inicial=10, fator_timeout=3, excecoes_timeout=(TimeoutError,),
+                 limite_falhas=3, tempo_recuperacao=30, limite_chaves_servico=2, workers_por_chave=4):
+        self.timeout_minimo = timeout_minimo
+        self.timeout_inicial = timeout_inicial
+        self.fator_timeout = fator_timeout
+        self.excecoes_timeout = excecoes_timeout
+        self.limite_falhas = limite_falhas
+        self.tempo_recuperacao = tempo_recuperacao
+        self.limite_chaves_servico = limite_chaves_servico
+        # Abre na primeira falha registrada; só é acionado quando
+        # `limite_chaves_servico` chaves diferentes falharam sem nenhum sucesso entre elas.
+        self.servico = Disjuntor(1, tempo_recuperacao)
+        self._chaves_com_falha = set()
+        self._disjuntores = {}
+        self._lock = threading.Lock()
+        self._latencias = defaultdict(EstatisticasLatencia)
+        self._hedges = defaultdict(int)
+        self._ultimos_valores = {}
+        # Um pool por chave: requisições presas numa aba lenta não ocupam os
+        # workers das outras abas.
+        self.workers_por_chave = workers_por_chave
+        self._executores = {}
+        self._em_andamento = defaultdict(int)
+
+    def disjuntor(self, chave):
+        """Disjuntor da chave, criado fechado no primeiro uso."""
+        with self._lock:
+            if chave not in self._disjuntores:
+                self._disjuntores[chave] = Disjuntor(self.limite_falhas, self.tempo_recuperacao)
+            return self._disjuntores[chave]
+
+    def _executor(self, chave):
+        with self._lock:
+            if chave not in self._executores:
+                self._executores[chave] = ThreadPoolExecutor(
+                    max_workers=self.workers_por_chave, thread_name_prefix=f"gas-{chave}"
+                )
+            return self._executores[chave]
+
+    def _submeter(self, chave, requisicao, timeout):
+        """
+        Agenda `requisicao(timeout)` no pool da chave. Retorna o futuro, cujo
+        resultado é (resposta, segundos de execução), e um Event marcado quando
+        um worker começa a executá-la: o tempo na fila não entra na latência.
+        """
+        comecou = threading.Event()
+
+        def tarefa():
+            comecou.set()
+            inicio = time.monotonic()
+            return requisicao(timeout), time.monotonic() - inicio
+
+        def terminou(_):
+            with self._lock:
+                self._em_andamento[chave] -= 1
+
+        with self._lock:
+            self._em_andamento[chave] += 1
+        futuro = self._executor(chave).submit(tarefa)
+        futuro.add_done_callback(terminou)
+        return futuro, comecou
+
+    def _worker_livre(self, chave):
+        with self._lock:
+            return self._em_andamento[chave] < self.workers_por_chave
+
+    def timeout_para(self, chave, teto):
+        """
+        Timeout da próxima requisição: `fator_timeout` x p99 da chave, limitado a
+        [timeout_minimo, teto]; `timeout_inicial` enquanto a chave tem poucas amostras.
+        """
+        p99 = self._latencias[chave].percentil(99)
+        if p99 is None:
+            return min(teto, self.timeout_inicial)
+        return min(teto, max(self.timeout_minimo, p99 * self.fator_timeout))
+
+    def _falha_de_leitura(self, chave):
+        with self._lock:
+            self._chaves_com_falha.add(chave)
+            abrir = len(self._chaves_com_falha) >= self.limite_chaves_servico
+        if abrir:
+            self.servico.falha()
+
+    def _sucesso_de_leitura(self):
+        with self._lock:
+            self._chaves_com_falha.clear()
+        self.servico.sucesso()
+
+    def executar(self, chave, requisicao, tentativas=3, teto_timeout=30, hedge=True):
+        """
+        Leitura idempotente: chama `requisicao(timeout)` até `tentativas` vezes,
+        todas dentro de `teto_timeout` segundos no total. Com `hedge`, dispara uma
+        segunda requisição idêntica se a primeira passar do p95 da chave e usa a
+        que responder primeiro. Enquanto a chave não tem amostras, um timeout no
+        `timeout_inicial` não conta para o disjuntor da chave: a aba pode apenas
+        ser mais lenta que ele, e a tentativa seguinte usa todo o prazo restante.
+        Lança ServicoIndisponivel se o circuito estiver aberto ou se nenhuma
+        tentativa der certo.
+        """
+        disjuntor = self.disjuntor(chave)
+        prazo = time.monotonic() + teto_timeout
+        ultimo_erro = None
+        ate_o_teto = False
+        for _ in range(tentativas):
+            if self.servico.estado == Disjuntor.ABERTO:
+                raise ServicoIndisponivel("Apps Script sem resposta em várias abas seguidas")
+            if not disjuntor.permite():
+                raise ServicoIndisponivel(f"circuito de '{chave}' aberto após falhas seguidas")
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                disjuntor.liberar_teste()
+                break
+            sem_amostras = self._latencias[chave].percentil(99) is None
+            timeout = restante if ate_o_teto else min(self.timeout_para(chave, teto_timeout), restante)
+            try:
+                resultado = self._chamar(chave, requisicao, timeout, hedge, restante)
+            except FilaCheia:
+                # Nem chegou a ser enviada: não é falha do Apps Script.
+                disjuntor.liberar_teste()
+                raise
+            except Exception as e:
+                self._falha_de_leitura(chave)
+                ultimo_erro = e
+                if isinstance(e, self.excecoes_timeout):
+                    self._latencias[chave].registrar(timeout)
+                    if sem_amostras and not ate_o_teto:
+                        disjuntor.liberar_teste()
+                        ate_o_teto = True
+                        continue
+                disjuntor.falha()
+                continue
+            disjuntor.sucesso()
+            self._sucesso_de_leitura()
+            return resultado
+        raise ServicoIndisponivel(str(ultimo_erro or f"prazo de {teto_timeout} s esgotado"))
+
+    def executar_escrita(self, chave, requisicao, teto_timeout=10):
+        """
+        Gravação não idempotente: chama `requisicao(teto_timeout)` uma única vez,
+        na thread de quem chamou, passando só pelo disjuntor da chave. Assim uma
+        gravação nunca fica na fila nem termina depois de o usuário ver o erro.
+        Exceções da requisição são repassadas.
+        """
+        disjuntor = self.disjuntor(chave)
+        if not disjuntor.permite():
+            raise ServicoIndisponivel(f"circuito de '{chave}' aberto após falhas seguidas")
+        inicio = time.monotonic()
+        try:
+            resultado = requisicao(teto_timeout)
+        except Exception:
+            disjuntor.falha()
+            raise
+        disjuntor.sucesso()
+        self._latencias[chave].registrar(time.monotonic() - inicio)
+        return resultado
+
+    def _chamar(self, chave, requisicao, timeout, hedge, limite_fila):
+        """
+        Uma tentativa: `timeout` conta a partir do momento em que um worker começa
+        a requisição. Se nenhum worker da chave ficar livre em `limite_fila`
+        segundos, cancela e lança FilaCheia. O hedge só é disparado se houver um
+        worker livre, para não disputar os workers quando o serviço está lento.
+        """
+        primeiro, comecou = self._submeter(chave, requisicao, timeout)
+        if not comecou.wait(limite_fila) and primeiro.cancel():
+            raise FilaCheia(f"'{chave}': nenhum worker livre em {limite_fila:.1f} s")
+        comecou.wait()
+        inicio = time.monotonic()
+        pendentes = {primeiro}
+        atraso_hedge = self._latencias[chave].percentil(95) if hedge else None
+        if atraso_hedge is not None and atraso_hedge < timeout:
+            concluidos, _ = wait(pendentes, timeout=atraso_hedge)
+            if not concluidos and self._worker_livre(chave):
+                self._hedges[chave] += 1
+                pendentes.add(self._submeter(chave, requisicao, timeout)[0])
+        erro = None
+        while pendentes:
+            concluidos, pendentes = wait(
+                pendentes, timeout=max(0, inicio + timeout - time.monotonic()), return_when=FIRST_COMPLETED
+            )
+            if not concluidos:
+                break
+            for futuro in concluidos:
+                if futuro.exception() is None:
+                    resultado, duracao = futuro.result()
+                    self._latencias[chave].registrar(duracao)
+                    _abandonar(pendentes)
+                    return resultado
+                erro = futuro.exception()
+        _abandonar(pendentes)
+        raise erro or TimeoutError(f"'{chave}' sem resposta em {timeout:.1f} s")
+
+    def guardar_valor(self, chave, valor):
+        self._ultimos_valores[chave] = (valor, time.time())
+
+    def ultimo_valor(self, chave):
+        """Retorna (valor, timestamp) do último carregamento válido da chave, ou (None, None)."""
+        return self._ultimos_valores.get(chave, (None, None))
+
+    def estado(self):
+        """Resumo para a interface: estado dos disjuntores e latências por chave."""
+        latencias = {}
+        for chave, estatisticas in list(self._latencias.items()):
+            p99 = estatisticas.percentil(99)
+            latencias[chave] = {
+                "amostras": len(estatisticas),
+                "p50": estatisticas.percentil(50),
+                "p95": estatisticas.percentil(95),
+                "timeout": self.timeout_inicial if p99 is None else max(self.timeout_minimo, p99 * self.fator_timeout),
+                "hedges": self._hedges[chave]
+            }
+        with self._lock:
+            disjuntores = dict(self._disjuntores)
+        return {
+            "servico": self.servico.estado,
+            "segundos_para_teste": self.servico.segundos_para_teste(),
+            "disjuntores": {
+                chave: {
+                    "estado": disjuntor.estado,
+                    "falhas_seguidas": disjuntor.falhas_seguidas,
+                    "segundos_para_teste": disjuntor.segundos_para_teste()
+                }
+                for chave, disjuntor in disjuntores.items()
+            },
+            "latencias": latencias
+        }
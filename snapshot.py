@@ -0,0 +1,136 @@
+"""
+Snapshot compartilhado das abas da planilha em arquivos Arrow IPC.
+
+Um único processo atualizador (`python snapshot.py`) busca as abas no Google
+Apps Script e publica cada uma em SNAPSHOT_DIR, com rename atômico. As réplicas
+do app apenas mapeiam os arquivos em memória (somente leitura) e só recarregam
+quando a versão publicada muda. Sem SNAPSHOT_DIR, o app consulta o Apps Script
+diretamente, assim como para abas cujo snapshot não é confirmado pelo
+atualizador há mais de SNAPSHOT_VALIDADE segundos (atualizador parado).
+
+No docker-compose.yml, o atualizador é o serviço `snapshot`, que usa a mesma
+imagem do app e compartilha o volume de SNAPSHOT_DIR.
+"""
+import os
+import time
+import datetime
+import pyarrow as pa
+import pyarrow.ipc
+from dotenv import load_dotenv
+import planilha
+
+load_dotenv()
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+INTERVALO_ATUALIZACAO = int(os.getenv("SNAPSHOT_INTERVALO", "300"))
+VALIDADE = int(os.getenv("SNAPSHOT_VALIDADE", str(3 * INTERVALO_ATUALIZACAO)))
+ABAS = ["Funcionario", "Cliente", "Processo", "Escritorio", "Historico_Peticao", "Lead"]
+
+def caminho_snapshot(tipo, diretorio=None):
+    return os.path.join(diretorio or SNAPSHOT_DIR, f"{tipo}.arrow")
+
+def versao_snapshot(tipo, diretorio=None):
+    """
+    Retorna a versão do snapshot publicado da aba (inode + mtime do arquivo),
+    ou None se não houver snapshot.
+    """
+    if not (diretorio or SNAPSHOT_DIR):
+        return None
+    try:
+        info = os.stat(caminho_snapshot(tipo, diretorio))
+    except FileNotFoundError:
+        return None
+    return f"{info.st_ino}-{info.st_mtime_ns}"
+
+def marcar_verificado(tipo, diretorio=None):
+    """Registra que o atualizador confirmou a aba sem alterações (o snapshot não é regravado)."""
+    caminho = f"{caminho_snapshot(tipo, diretorio)}.verificado"
+    with open(caminho, "a"):
+        pass
+    os.utime(caminho)
+
+def idade_snapshot(tipo, diretorio=None):
+    """
+    Segundos desde a última confirmação do snapshot da aba pelo atualizador
+    (publicação ou verificação sem alterações), ou None se não houver snapshot.
+    """
+    if not (diretorio or SNAPSHOT_DIR):
+        return None
+    caminho = caminho_snapshot(tipo, diretorio)
+    try:
+        confirmado_em = os.stat(caminho).st_mtime
+    except FileNotFoundError:
+        return None
+    try:
+        confirmado_em = max(confirmado_em, os.stat(f"{caminho}.verificado").st_mtime)
+    except FileNotFoundError:
+        pass
+    return max(0.0, time.time() - confirmado_em)
+
+def ler_snapshot(tipo, diretorio=None):
+    """
+    Mapeia o snapshot da aba em memória (somente leitura) e retorna a pa.Table.
+    Os buffers da tabela apontam para o arquivo mapeado, sem cópia.
+    """
+    with pa.memory_map(caminho_snapshot(tipo, diretorio), "r") as fonte:
+        return pa.ipc.open_file(fonte).read_all()
+
+def _sincronizar_diretorio(diretorio):
+    # Persiste a entrada criada pelo os.replace (sem efeito no Windows).
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    descritor = os.open(diretorio or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
+
+def publicar_snapshot(tipo, df, diretorio=None):
+    """
+    Grava o DataFrame da aba em um arquivo temporário e o publica com
+    os.replace, de modo que leitores nunca vejam um arquivo pela metade.
+    O temporário e o diretório são sincronizados em disco (fsync), para que
+    uma queda da máquina não deixe publicado um arquivo vazio ou truncado.
+    Se o conteúdo não mudou, mantém a versão atual e retorna False.
+    """
+    caminho = caminho_snapshot(tipo, diretorio)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    if versao_snapshot(tipo, diretorio) and ler_snapshot(tipo, diretorio).equals(tabela):
+        return False
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[b"publicado_em"] = datetime.datetime.now().isoformat().encode()
+    tabela = tabela.replace_schema_metadata(metadados)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as destino:
+        with pa.ipc.new_file(destino, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        destino.flush()
+        os.fsync(destino.fileno())
+    os.replace(temporario, caminho)
+    _sincronizar_diretorio(os.path.dirname(caminho))
+    return True
+
+def atualizar_snapshots(buscar_tabela, abas=ABAS, diretorio=None):
+    """
+    Busca cada aba com `buscar_tabela(tipo)` e publica o snapshot, ou só marca
+    como verificado se não mudou. Abas que falharem mantêm a última versão
+    publicada, que o app deixa de usar depois de VALIDADE segundos.
+    """
+    for tipo in abas:
+        try:
+            tabela = buscar_tabela(tipo)
+        except Exception as e:
+            print(f"[snapshot] Falha ao carregar '{tipo}' ({e}), mantendo a versão anterior.")
+            continue
+        if publicar_snapshot(tipo, tabela, diretorio):
+            print(f"[snapshot] '{tipo}' publicado ({len(tabela)} linhas).")
+        else:
+            marcar_verificado(tipo, diretorio)
+
+if __name__ == "__main__":
+    if not SNAPSHOT_DIR:
+        raise SystemExit("Defina SNAPSHOT_DIR com o diretório compartilhado dos snapshots.")
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    while True:
+        atualizar_snapshots(planilha.buscar_tabela_da_planilha)
+        time.sleep(INTERVALO_ATUALIZACAO)